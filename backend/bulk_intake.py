@@ -0,0 +1,24 @@
+import argparse
+import sys
+from services.intake_service import iter_bulk_intake, to_ndjson, DEFAULT_CHUNK_SIZE
+
+# Bulk intake CLI: triages + admits every row of a patient_data.csv-format file.
+# Writes one NDJSON result per patient to stdout.
+# Usage: python bulk_intake.py patients.csv > results.ndjson
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk triage + admission from CSV")
+    parser.add_argument("csv_path", help="File in patient_data.csv format ('-' for stdin)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Rows per inference batch / DB transaction")
+    parser.add_argument("--use-llm", action="store_true",
+                        help="Extract symptoms with Gemini (one call per row, keywords while it's saturated)")
+    parser.add_argument("--explain", action="store_true",
+                        help="Add per-feature contributions for the risk and department heads")
+    args = parser.parse_args()
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be >= 1")
+
+    source = sys.stdin if args.csv_path == "-" else args.csv_path
+    for line in to_ndjson(iter_bulk_intake(source, args.chunk_size, args.use_llm, args.explain)):
+        sys.stdout.write(line)
@@ -1,19 +1,136 @@
 import sqlite3
+import contextlib
+import contextvars
+import json
 import os
+import threading
 import uuid
 from datetime import datetime
 
 DB_NAME = "triagex.db"
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, DB_NAME)
+DB_PATH = os.getenv("TRIAGEX_DB_PATH", os.path.join(BASE_DIR, DB_NAME))
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
+# --- Facility Sharding ---
+# Each facility has its own SQLite shard (own file, own write lock).
+# The shard map places facilities on nodes. A node is a data directory on a LOCAL disk
+# of this host (e.g. one disk per node to spread write I/O); every shard is opened by
+# this process. Don't point nodes at NFS/SMB mounts: SQLite locking isn't safe there.
+# {
+#   "nodes": {"node-a": "/data/disk1/triagex", "node-b": "/data/disk2/triagex"},
+#   "facilities": {"st-marys": {"node": "node-a"}, "city-general": {"node": "node-b", "db": "city.db"}}
+# }
+# The "default" facility (no header / prefix) keeps using DB_PATH.
+# Scaling out across machines = several instances, each with its own shard map, behind
+# a router on /f/{facility}; /network/* then only covers the local instance's facilities.
+DEFAULT_FACILITY = "default"
+
+_shard_map = {"nodes": {}, "facilities": {}}
+_current_facility = contextvars.ContextVar("facility", default=DEFAULT_FACILITY)
+_initialized = set()
+_init_lock = threading.Lock()
+
+def load_shard_map(shard_map):
+    """
+    shard_map: dict, or path to a JSON file in the format above.
+    """
+    global _shard_map
+    if isinstance(shard_map, str):
+        with open(shard_map) as f:
+            shard_map = json.load(f)
+    _shard_map = {
+        "nodes": dict(shard_map.get("nodes", {})),
+        "facilities": dict(shard_map.get("facilities", {}))
+    }
+
+def list_facilities():
+    return [DEFAULT_FACILITY] + [f for f in _shard_map["facilities"] if f != DEFAULT_FACILITY]
+
+def is_known_facility(facility: str) -> bool:
+    return facility == DEFAULT_FACILITY or facility in _shard_map["facilities"]
+
+def get_facility() -> str:
+    return _current_facility.get()
+
+def set_facility(facility: str):
+    """
+    Selects the facility for this request/task. Returns a token for reset_facility.
+    """
+    if not is_known_facility(facility):
+        raise KeyError(f"Unknown facility: {facility}")
+    return _current_facility.set(facility)
+
+def reset_facility(token):
+    _current_facility.reset(token)
+
+@contextlib.contextmanager
+def facility_context(facility: str):
+    token = set_facility(facility)
+    try:
+        yield
+    finally:
+        reset_facility(token)
+
+def get_db_path(facility: str = None) -> str:
+    facility = facility or get_facility()
+    if facility == DEFAULT_FACILITY:
+        return DB_PATH
+    shard = _shard_map["facilities"][facility]
+    node_dir = _shard_map["nodes"].get(shard.get("node"), BASE_DIR)
+    return os.path.join(node_dir, shard.get("db", f"{facility}.db"))
+
+def use_database(path: str):
+    """
+    Points the default facility at another DB.
+    SQLite URIs are supported, e.g. "file:sim?mode=memory&cache=shared" for an in-memory DB
+    (keep one connection open or it is dropped).
+    """
+    global DB_PATH
+    DB_PATH = path
+
+def _connect(path: str):
+    conn = sqlite3.connect(path, uri=path.startswith("file:"))
     conn.row_factory = sqlite3.Row
     return conn
 
+def get_db_connection():
+    """
+    Connection to the current facility's shard (created + initialized on first use).
+    """
+    path = get_db_path()
+    # A path is only marked once init_db has finished, so the unlocked check
+    # never lets a request through to a shard whose tables don't exist yet.
+    if path not in _initialized:
+        with _init_lock:
+            if path not in _initialized:
+                if not path.startswith("file:"):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                init_db()
+                _initialized.add(path)
+    return _connect(path)
+
+PATIENT_CODE_SEQUENCE = "patient_code"
+
+def next_sequence_values(cursor, name: str, count: int = 1):
+    """
+    Reserves `count` consecutive values from a named sequence.
+    Runs inside the caller's transaction (the UPDATE takes the write lock).
+    """
+    cursor.execute('UPDATE sequences SET value = value + ? WHERE name = ?', (count, name))
+    cursor.execute('SELECT value FROM sequences WHERE name = ?', (name,))
+    last = cursor.fetchone()[0]
+    return range(last - count + 1, last + 1)
+
+def format_patient_code(n: int) -> str:
+    # 6+ digits, so never equal to a legacy 4-hex-char P-XXXX code
+    return f"P-{n:06d}"
+
 def init_db():
-    conn = get_db_connection()
+    """
+    Creates / migrates the schema of the current facility's shard.
+    """
+    path = get_db_path()
+    conn = _connect(path)
     cursor = conn.cursor()
 
     # 1. Departments Table
@@ -48,9 +165,42 @@ def init_db():
             assigned_department TEXT,
             status TEXT DEFAULT 'waiting', -- waiting, assigned, completed
             priority_weight INTEGER DEFAULT 0,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            name TEXT,
+            age INTEGER,
+            gender TEXT,
+            symptoms TEXT,
+            vitals TEXT
+        )
+    ''')
+
+    # 4. Sequences (short codes)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sequences (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
         )
     ''')
+    cursor.execute('INSERT OR IGNORE INTO sequences (name, value) VALUES (?, 0)', (PATIENT_CODE_SEQUENCE,))
+
+    # Legacy random codes may collide: re-code all but the first of each duplicate
+    cursor.execute('''
+        SELECT rowid FROM patients
+        WHERE patient_code IN (SELECT patient_code FROM patients GROUP BY patient_code HAVING count(*) > 1)
+        AND rowid NOT IN (SELECT min(rowid) FROM patients GROUP BY patient_code)
+    ''')
+    dupes = [row[0] for row in cursor.fetchall()]
+    if dupes:
+        codes = next_sequence_values(cursor, PATIENT_CODE_SEQUENCE, len(dupes))
+        cursor.executemany('UPDATE patients SET patient_code = ? WHERE rowid = ?',
+                           [(format_patient_code(n), rowid) for n, rowid in zip(codes, dupes)])
+        print(f"✅ Re-coded {len(dupes)} duplicate patient codes")
+
+    # Code lookups (discharge) + uniqueness
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_patients_code ON patients (patient_code)')
+
+    # Date-range scans for exports
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_patients_created_at ON patients (created_at)')
 
     # Seed Departments if empty
     cursor.execute('SELECT count(*) FROM departments')
@@ -70,7 +220,10 @@ def init_db():
 
     conn.commit()
     conn.close()
-    print(f"✅ Database initialized at {DB_PATH}")
+    print(f"✅ Database initialized at {path}")
+
+if os.getenv("TRIAGEX_SHARD_MAP"):
+    load_shard_map(os.environ["TRIAGEX_SHARD_MAP"])
 
 if __name__ == "__main__":
     init_db()
@@ -1,15 +1,31 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, File, UploadFile, HTTPException, Header, Response, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from fastapi.routing import APIRoute
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
+from datetime import date, timedelta
+import hmac
+import json
+import time
 
 # Services
-from model_service import predict_risk
+import model_service
+from model_service import predict_risk, explain_features, load_models
 from services.doctor_service import add_doctor, toggle_doctor_activation, get_doctors_by_department
 from services.queue_service import get_department_stats, get_overall_queue_stats
-from services.patient_service import admit_patient, get_waiting_patients, discharge_patient
+from services.patient_service import admit_patient, get_waiting_patients, discharge_patient, discharge_patients
 from services.ai_service import generate_medical_insight
-from database import init_db
+from services.routing_service import get_routing_snapshot
+from services.intake_service import iter_bulk_intake, to_ndjson, DEFAULT_CHUNK_SIZE
+from services.export_service import iter_patient_export, EXPORT_FORMATS
+from services.admission_service import get_gate, get_admission_stats, ANALYZE_QUEUE_SECONDS
+from services.idempotency_service import (
+    run_once, payload_key, IdempotencyKeyReused, IDEMPOTENCY_KEY_TTL_SECONDS, PAYLOAD_HASH_TTL_SECONDS
+)
+from services.network_service import get_network_stats, get_network_analytics
+from services import profiler_service
+from database import init_db, is_known_facility, set_facility, reset_facility, DEFAULT_FACILITY
 
 app = FastAPI()
 
@@ -25,6 +41,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profile a sampled fraction of requests while an admin profiling session is active.
+# Plain ASGI (like FacilityMiddleware): no per-request overhead when idle.
+class ProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        session = profiler_service.begin_request(scope["path"])
+        if session is None:
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler_service.end_request(session)
+
+app.add_middleware(ProfilerMiddleware)
+
+# Facility routing: "/f/{facility}/..." path prefix or X-Facility-Id header.
+# Selects the facility's DB shard and in-memory state for the rest of the request.
+class FacilityMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        facility = None
+        path = scope["path"]
+        if path.startswith("/f/"):
+            facility, _, rest = path[3:].partition("/")
+            scope = dict(scope, path="/" + rest, raw_path=("/" + rest).encode())
+        else:
+            for name, value in scope.get("headers", []):
+                if name == b"x-facility-id":
+                    facility = value.decode()
+                    break
+        facility = facility or DEFAULT_FACILITY
+
+        if not is_known_facility(facility):
+            response = JSONResponse({"detail": f"Unknown facility: {facility}"}, status_code=404)
+            return await response(scope, receive, send)
+
+        token = set_facility(facility)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_facility(token)
+
+app.add_middleware(FacilityMiddleware)
+
 # --- Pydantic Models ---
 class DoctorCreate(BaseModel):
     name: str
@@ -42,10 +112,52 @@ class PredictRequest(BaseModel):
     Symptoms: str
     Vitals: dict # Expected {BP, HR, Temp} or similar
 
+class BulkDischarge(BaseModel):
+    ids: List[str]  # patient IDs and/or patient codes
+
+class ProfileStart(BaseModel):
+    endpoint: str  # route path, e.g. "/predict" or "/dashboard/stats"
+    sample_rate: float = 0.1
+    duration_seconds: int = 300
+    interval_ms: float = 5
+
+# --- Admin ---
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Admin surface is off unless TRIAGEX_ADMIN_TOKEN is set
+    expected = profiler_service.admin_token()
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
 # --- Endpoints ---
 
 @app.post("/predict")
-def triage_patient(data: dict):
+def triage_patient(data: dict, response: Response, explain: bool = False,
+                   idempotency_key: Optional[str] = Header(None)):
+    # Retries (flaky tablet Wi-Fi) replay the first admission instead of admitting twice.
+    # No Idempotency-Key header -> dedupe on the payload hash for a short window.
+    fingerprint = payload_key(data)
+    if idempotency_key:
+        key, ttl = f"predict:key:{idempotency_key}", IDEMPOTENCY_KEY_TTL_SECONDS
+    else:
+        key, ttl = f"predict:payload:{fingerprint}", PAYLOAD_HASH_TTL_SECONDS
+
+    try:
+        (result, features), replayed = run_once(key, lambda: _triage_and_admit(data), ttl, fingerprint)
+    except IdempotencyKeyReused:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different payload")
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+
+    # Explanations come from the stored feature vector, so a retry that adds
+    # ?explain=true gets one for the original admission.
+    if explain:
+        result = {**result, "explanation": explain_features(features)}
+    return result
+
+def _triage_and_admit(data: dict):
     # 1. ML Prediction
     # We use model_service just for the raw ML output now
     # We need to extract the parts manually if we want to use 'admit_patient' logic separate
@@ -60,7 +172,9 @@ def triage_patient(data: dict):
     # The frontend sends a nested dict sometimes.
     # Let's flatten if needed or pass as is if valid.
     
-    ml_result = predict_risk(data) 
+    # Gemini symptom extraction is optional: when the LLM is saturated (admission gate),
+    # fails or times out, triage on local keyword matching and flag the response as degraded.
+    ml_result, features = predict_risk(data, use_llm=True, return_features=True)
     
     # 2. Workflow Logic (Admit & Route)
     admission = admit_patient(
@@ -69,13 +183,13 @@ def triage_patient(data: dict):
         recommended_dept=ml_result["recommended_dept"]
     )
     
-    # Merge results
+    # Merge results (+ the feature vector, for explaining replays)
     return {
         **ml_result,
         "assigned_dept": admission["assigned_dept"], # Dynamic Override
         "patient_id": admission["id"],
         "priority_weight": admission["priority"]
-    }
+    }, features
 
 @app.get("/dashboard/stats")
 def get_dashboard_metrics():
@@ -86,6 +200,25 @@ def get_dashboard_metrics():
         "queue": queue_stats
     }
 
+@app.get("/dashboard/routing")
+def get_routing_load():
+    return get_routing_snapshot()
+
+@app.get("/dashboard/admission")
+def get_admission_load():
+    return get_admission_stats()
+
+@app.get("/network/stats")
+def get_network_dashboard():
+    # Fan out to every facility shard of THIS instance in parallel and merge
+    # (facilities served by other instances are not included)
+    return get_network_stats()
+
+@app.get("/network/analytics")
+def get_network_charts():
+    # /dashboard/analytics for every facility of this instance, plus totals
+    return get_network_analytics()
+
 @app.get("/patients")
 def get_live_queue():
     return get_waiting_patients()
@@ -100,10 +233,59 @@ def discharge(patient_id: str):
     success = discharge_patient(patient_id)
     return {"success": success}
 
+@app.post("/patients/discharge")
+def discharge_many(req: BulkDischarge):
+    return discharge_patients(req.ids)
+
+@app.post("/patients/bulk")
+def bulk_intake(file: UploadFile = File(...), chunk_size: int = DEFAULT_CHUNK_SIZE,
+                use_llm: bool = False, explain: bool = False):
+    # CSV in patient_data.csv format -> one NDJSON line per patient, streamed as chunks finish
+    if chunk_size < 1:
+        raise HTTPException(status_code=400, detail="chunk_size must be >= 1")
+    return StreamingResponse(
+        to_ndjson(iter_bulk_intake(file.file, chunk_size, use_llm, explain)),
+        media_type="application/x-ndjson"
+    )
+
+@app.get("/export/patients")
+def export_patients(
+    format: str = "csv",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    department: Optional[str] = None,
+    include_archived: bool = False
+):
+    # Audit export: streamed straight off the DB cursor. start/end are inclusive days.
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+
+    start_ts = f"{start} 00:00:00" if start else None
+    end_ts = f"{end + timedelta(days=1)} 00:00:00" if end else None
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+
+    return StreamingResponse(
+        iter_patient_export(format, start_ts, end_ts, department, include_archived),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=patients.{format}"}
+    )
+
 @app.post("/patients/analyze")
 def analyze_patient(data: dict):
     # Expects full patient data or similar to predict
-    insight = generate_medical_insight(data)
+    # Optional LLM work: queue briefly for a slot (bounded queue), otherwise shed with 503
+    llm = get_gate("llm")
+    if not llm.try_acquire(timeout=ANALYZE_QUEUE_SECONDS):
+        raise HTTPException(
+            status_code=503,
+            detail="AI analysis is temporarily overloaded. Please retry.",
+            headers={"Retry-After": str(llm.retry_after())}
+        )
+    started = time.monotonic()
+    try:
+        insight = generate_medical_insight(data)
+    finally:
+        llm.release(time.monotonic() - started)
     return {"insight": insight}
 
 # --- Doctor Management ---
@@ -131,3 +313,56 @@ def list_departments():
     depts = conn.execute("SELECT * FROM departments").fetchall()
     conn.close()
     return [dict(d) for d in depts]
+
+
+# --- Admin: Sampling Profiler ---
+
+@app.post("/admin/profile/start", dependencies=[Depends(require_admin)])
+def start_profile(req: ProfileStart):
+    route = next((r for r in app.routes if isinstance(r, APIRoute) and r.path == req.endpoint), None)
+    if route is None:
+        raise HTTPException(status_code=404, detail=f"Unknown endpoint {req.endpoint}")
+    if not 0 < req.sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate must be in (0, 1]")
+    if req.interval_ms < 1 or req.duration_seconds <= 0:
+        raise HTTPException(status_code=400, detail="interval_ms must be >= 1 and duration_seconds > 0")
+
+    return profiler_service.start_session(
+        endpoint=req.endpoint,
+        path_regex=route.path_regex,
+        endpoint_code=route.endpoint.__code__,
+        sample_rate=req.sample_rate,
+        duration_seconds=req.duration_seconds,
+        interval_ms=req.interval_ms
+    )
+
+@app.post("/admin/profile/stop", dependencies=[Depends(require_admin)])
+def stop_profile():
+    return profiler_service.stop_session()
+
+@app.get("/admin/profile", dependencies=[Depends(require_admin)])
+def profile_status():
+    return profiler_service.get_session_status()
+
+@app.get("/admin/profile/download", dependencies=[Depends(require_admin)])
+def download_profile(format: str = "speedscope"):
+    if format == "collapsed":
+        return PlainTextResponse(
+            profiler_service.export_collapsed(),
+            headers={"Content-Disposition": "attachment; filename=profile.collapsed.txt"}
+        )
+    if format == "speedscope":
+        return Response(
+            content=json.dumps(profiler_service.export_speedscope()),
+            media_type="application/json",
+            headers={"Content-Disposition": "attachment; filename=profile.speedscope.json"}
+        )
+    raise HTTPException(status_code=400, detail="format must be speedscope or collapsed")
+
+# --- Admin: Models ---
+
+@app.post("/admin/models/reload", dependencies=[Depends(require_admin)])
+def reload_models():
+    # Picks up retrained files in models/ without a restart
+    reloaded = load_models()
+    return {"reloaded": reloaded, "model_version": model_service.MODEL_BUNDLE_VERSION}
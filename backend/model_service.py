@@ -1,31 +1,77 @@
 import joblib
+import numpy as np
 import pandas as pd
+import xgboost as xgb
+import hashlib
 import os
-from services.nlp_service import extract_symptoms
+import threading
+import time
+from services.admission_service import get_gate
+from services.nlp_service import extract_symptoms, extract_symptoms_local
 
 
 # Resolve paths relative to this file's directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Load all models and encoders
-risk_model = joblib.load(os.path.join(BASE_DIR, "models/risk_model.pkl"))
-risk_encoder = joblib.load(os.path.join(BASE_DIR, "models/label_encoder.pkl"))
+MODEL_FILES = {
+    "risk_model": "models/risk_model.pkl",
+    "risk_encoder": "models/label_encoder.pkl",
+    "dept_model": "models/dept_model.pkl",
+    "dept_encoder": "models/dept_encoder.pkl",
+    "advice_model": "models/advice_model.pkl",
+    "advice_encoder": "models/advice_encoder.pkl",
+    "feature_names": "models/feature_names.pkl",
+}
 
-dept_model = joblib.load(os.path.join(BASE_DIR, "models/dept_model.pkl"))
-dept_encoder = joblib.load(os.path.join(BASE_DIR, "models/dept_encoder.pkl"))
+_load_lock = threading.Lock()
 
-advice_model = joblib.load(os.path.join(BASE_DIR, "models/advice_model.pkl"))
-advice_encoder = joblib.load(os.path.join(BASE_DIR, "models/advice_encoder.pkl"))
-
-feature_names = joblib.load(os.path.join(BASE_DIR, "models/feature_names.pkl"))
-
-def predict_risk(input_data: dict):
+def load_models():
     """
-    Predict risk level, department, and safety advice.
+    (Re)loads all models and encoders if the files changed.
+    The bundle version is a hash of the files.
+    Returns True if a new bundle was loaded.
+    """
+    with _load_lock:
+        return _load_models()
+
+def _load_models():
+    global risk_model, risk_encoder, dept_model, dept_encoder, advice_model, advice_encoder, feature_names
+    global MODEL_BUNDLE_VERSION
+
+    digest = hashlib.sha256()
+    paths = {name: os.path.join(BASE_DIR, rel_path) for name, rel_path in MODEL_FILES.items()}
+    for path in paths.values():
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    version = digest.hexdigest()[:12]
+    if version == globals().get("MODEL_BUNDLE_VERSION"):
+        return False
+
+    loaded = {name: joblib.load(path) for name, path in paths.items()}
+    risk_model, risk_encoder = loaded["risk_model"], loaded["risk_encoder"]
+    dept_model, dept_encoder = loaded["dept_model"], loaded["dept_encoder"]
+    advice_model, advice_encoder = loaded["advice_model"], loaded["advice_encoder"]
+    feature_names = loaded["feature_names"]
+    MODEL_BUNDLE_VERSION = version
+    return True
+
+load_models()
+
+def _model_features(model, df):
+    """
+    Selects the columns a model was trained on.
+    Models picked by the serving sweep (train_model.py --sweep) may use a feature subset.
     """
+    cols = getattr(model, "feature_names_in_", None)
+    if cols is None:
+        return df
+    return df[list(cols)]
 
-    df = pd.DataFrame([input_data])
-    
+def _prepare_features(df, symptoms_lists):
+    """
+    Preprocessing (Must match training).
+    One extracted symptoms list per row of df.
+    """
     # Ensure types
     if "Age" in df.columns:
         df["Age"] = pd.to_numeric(df["Age"], errors='coerce').fillna(0).astype(int)
@@ -34,8 +80,6 @@ def predict_risk(input_data: dict):
     if "Temperature" in df.columns:
         df["Temperature"] = pd.to_numeric(df["Temperature"], errors='coerce').fillna(0.0).astype(float)
 
-
-    # --- Preprocessing (Must match training) ---
     df[["Systolic_BP", "Diastolic_BP"]] = df["Blood Pressure"].str.split("/", expand=True)
     df["Systolic_BP"] = df["Systolic_BP"].astype(int)
     df["Diastolic_BP"] = df["Diastolic_BP"].astype(int)
@@ -47,39 +91,146 @@ def predict_risk(input_data: dict):
     df["Age_Group"] = pd.cut(df["Age"], bins=[0,18,60,100], labels=[0,1,2]).astype(int)
     df["Gender"] = df["Gender"].map({"Female": 0, "Male": 1}).astype(int)
 
-    symptoms_list = extract_symptoms(input_data["Symptoms"])
-    df["Chest_Pain"] = int("chest pain" in symptoms_list)
-    df["Breathlessness"] = int("breathlessness" in symptoms_list)
-    df["Confusion"] = int("confusion" in symptoms_list)
-    df["Fever_Symptom"] = int("fever" in symptoms_list)
+    df["Chest_Pain"] = [int("chest pain" in s) for s in symptoms_lists]
+    df["Breathlessness"] = [int("breathlessness" in s) for s in symptoms_lists]
+    df["Confusion"] = [int("confusion" in s) for s in symptoms_lists]
+    df["Fever_Symptom"] = [int("fever" in s) for s in symptoms_lists]
 
-    df.drop(columns=["Blood Pressure", "Symptoms"], inplace=True)
-    df = df[feature_names]
+    return df[feature_names]
 
-    # --- Predictions ---
+def _score(df):
+    """
+    Runs all three heads on prepared features, one call per model.
+    Returns one result dict per row.
+    """
     # 1. Risk Level
-    risk_pred = risk_model.predict(df)
-    risk_level = risk_encoder.inverse_transform(risk_pred)[0]
+    risk_X = _model_features(risk_model, df)
+    risk_levels = risk_encoder.inverse_transform(risk_model.predict(risk_X))
     
     # Confidence
-    confidence = 0.0
+    confidences = [0.0] * len(df)
     if hasattr(risk_model, 'predict_proba'):
-        confidence = float(risk_model.predict_proba(df).max())
+        confidences = risk_model.predict_proba(risk_X).max(axis=1)
 
     # 2. Safety Advice
-    advice_pred = advice_model.predict(df)
-    advice = advice_encoder.inverse_transform(advice_pred)[0]
+    advice = advice_encoder.inverse_transform(advice_model.predict(_model_features(advice_model, df)))
 
     # 3. Department Recommendation & Availability
-    dept_pred = dept_model.predict(df)
-    recommended_dept = dept_encoder.inverse_transform(dept_pred)[0]
+    depts = dept_encoder.inverse_transform(dept_model.predict(_model_features(dept_model, df)))
     
-    return {
-        "risk_level": risk_level,
-        "confidence": confidence,
-        "recommended_dept": recommended_dept,
-        "safety_advice": advice
-    }
+    return [
+        {
+            "risk_level": risk_levels[i],
+            "confidence": float(confidences[i]),
+            "recommended_dept": depts[i],
+            "safety_advice": advice[i]
+        }
+        for i in range(len(df))
+    ]
+
+def _contributions(model, encoder, df):
+    """
+    Per-feature contributions (XGBoost pred_contribs, log-odds) towards each row's predicted class.
+    One DMatrix for the whole batch.
+    """
+    X = _model_features(model, df)
+    contribs = model.get_booster().predict(xgb.DMatrix(X), pred_contribs=True)
+    predicted = model.predict(X)
+    if contribs.ndim == 3:
+        # Multi-class: (rows, classes, features + bias)
+        contribs = contribs[np.arange(len(X)), predicted]
+    labels = encoder.inverse_transform(predicted)
+
+    explanations = []
+    for label, row in zip(labels, contribs):
+        ranked = sorted(zip(X.columns, row[:-1]), key=lambda kv: abs(kv[1]), reverse=True)
+        explanations.append({
+            "class": label,
+            "bias": float(row[-1]),
+            "contributions": {name: float(value) for name, value in ranked}
+        })
+    return explanations
+
+def _explain(df):
+    """
+    Native tree explanations for the risk and department heads.
+    """
+    risk = _contributions(risk_model, risk_encoder, df)
+    dept = _contributions(dept_model, dept_encoder, df)
+    return [{"risk": r, "department": d} for r, d in zip(risk, dept)]
+
+def _predict(df, explain: bool = False):
+    """
+    Scores prepared features.
+    explain=True adds per-feature contributions for the same vector.
+    """
+    results = _score(df)
+
+    if explain:
+        for result, explanation in zip(results, _explain(df)):
+            result["explanation"] = explanation
+    return results
+
+def _extract(text, use_llm: bool):
+    """
+    Returns (symptoms, degraded): degraded means use_llm was set but local keyword
+    matching was used because the LLM was saturated (admission gate) or failed.
+    Every Gemini call goes through the "llm" gate, so bulk traffic counts too.
+    """
+    if use_llm:
+        llm = get_gate("llm")
+        if llm.try_acquire():
+            started = time.monotonic()
+            try:
+                symptoms = extract_symptoms(text)
+            finally:
+                llm.release(time.monotonic() - started)
+            if symptoms is not None:
+                return symptoms, False
+    return extract_symptoms_local(text), use_llm
+
+def predict_risk(input_data: dict, use_llm: bool = True, explain: bool = False, return_features: bool = False):
+    """
+    Predict risk level, department, and safety advice.
+    use_llm=False skips Gemini symptom extraction (local keyword matching instead).
+    explain=True adds per-feature contributions for the risk and department heads.
+    "degraded" is True when Gemini was wanted but symptoms came from keyword matching.
+    return_features=True returns (result, features): the encoded vector, for explain_features.
+    """
+
+    df = pd.DataFrame([input_data])
+    symptoms_list, degraded = _extract(input_data["Symptoms"], use_llm)
+
+    features = _prepare_features(df, [symptoms_list])
+    result = _predict(features, explain)[0]
+    result["degraded"] = degraded
+    if return_features:
+        return result, features.iloc[0].to_dict()
+    return result
+
+def explain_features(features: dict):
+    """
+    Explanation for a stored feature vector (see predict_risk return_features),
+    e.g. to explain a replayed admission without triaging it again.
+    """
+    return _explain(pd.DataFrame([features])[feature_names])[0]
+
+def predict_risk_batch(records: list, use_llm: bool = False, explain: bool = False):
+    """
+    Batched predict_risk: one preprocessing pass and one call per model.
+    Symptoms are keyword-matched locally unless use_llm is set (one gated Gemini call
+    per row; rows fall back to keywords while the LLM is saturated).
+    """
+    if not records:
+        return []
+
+    df = pd.DataFrame(records)
+    extracted = [_extract(r.get("Symptoms"), use_llm) for r in records]
+
+    results = _predict(_prepare_features(df, [symptoms for symptoms, _ in extracted]), explain)
+    for result, (_, degraded) in zip(results, extracted):
+        result["degraded"] = degraded
+    return results
 
 
 # Quick test
@@ -0,0 +1,106 @@
+import math
+import threading
+import time
+
+# Admission control for optional dependencies (Gemini).
+# Saturated = too many calls in flight, or recent calls are too slow.
+LLM_MAX_IN_FLIGHT = 8
+LLM_SLOW_SECONDS = 5.0       # EWMA latency above this -> saturated
+LATENCY_WINDOW_SECONDS = 30  # slow samples older than this stop counting (lets us probe again)
+EWMA_ALPHA = 0.3
+ANALYZE_QUEUE_SECONDS = 2.0  # /patients/analyze waits this long for a slot before 503
+# Each waiter holds a worker thread (sync endpoints): beyond this many, shed at once
+# so a burst of optional calls can't exhaust the threadpool /predict runs on.
+LLM_MAX_WAITING = 4
+DEFAULT_RETRY_AFTER = 5
+
+class DependencyGate:
+    """
+    Tracks in-flight calls and latency (EWMA) for one dependency.
+    """
+    def __init__(self, name: str, max_in_flight: int, slow_seconds: float, max_waiting: int = 0):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.slow_seconds = slow_seconds
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self.waiting = 0
+        self.ewma_latency = None
+        self.last_sample_at = None
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def _too_slow(self, now: float) -> bool:
+        return (self.ewma_latency is not None
+                and self.ewma_latency > self.slow_seconds
+                and now - self.last_sample_at < LATENCY_WINDOW_SECONDS)
+
+    def try_acquire(self, timeout: float = 0) -> bool:
+        """
+        Takes a slot, waiting up to `timeout` seconds for one to free up.
+        Never waits while the dependency is slow or max_waiting callers already wait.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            queued = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    if self._too_slow(now):
+                        break
+                    if self.in_flight < self.max_in_flight:
+                        self.in_flight += 1
+                        return True
+                    if now >= deadline:
+                        break
+                    if not queued:
+                        if self.waiting >= self.max_waiting:
+                            break
+                        self.waiting += 1
+                        queued = True
+                    self._cond.wait(deadline - now)
+            finally:
+                if queued:
+                    self.waiting -= 1
+            self.rejected += 1
+            return False
+
+    def release(self, latency: float):
+        with self._cond:
+            self.in_flight -= 1
+            if self.ewma_latency is None:
+                self.ewma_latency = latency
+            else:
+                self.ewma_latency = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma_latency
+            self.last_sample_at = time.monotonic()
+            self._cond.notify()
+
+    def retry_after(self) -> int:
+        """
+        Seconds a shed client should wait: about one call's latency.
+        """
+        with self._cond:
+            if self.ewma_latency is None:
+                return DEFAULT_RETRY_AFTER
+            return max(1, math.ceil(self.ewma_latency))
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "waiting": self.waiting,
+                "ewma_latency_ms": None if self.ewma_latency is None else self.ewma_latency * 1000,
+                "saturated": self.in_flight >= self.max_in_flight or self._too_slow(time.monotonic()),
+                "rejected": self.rejected
+            }
+
+GATES = {
+    "llm": DependencyGate("llm", LLM_MAX_IN_FLIGHT, LLM_SLOW_SECONDS, LLM_MAX_WAITING),
+}
+
+def get_gate(name: str) -> DependencyGate:
+    return GATES[name]
+
+def get_admission_stats():
+    return {name: gate.stats() for name, gate in GATES.items()}
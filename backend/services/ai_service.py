@@ -1,6 +1,7 @@
 import os
 import google.generativeai as genai
 from dotenv import load_dotenv
+from services.nlp_service import LLM_TIMEOUT_SECONDS
 
 # Load env vars from root .env
 # Assuming .env is one level up from backend or in root
@@ -42,7 +43,7 @@ def generate_medical_insight(patient_data: dict) -> str:
         Format as clear Markdown.
         """
         
-        response = model.generate_content(prompt)
+        response = model.generate_content(prompt, request_options={"timeout": LLM_TIMEOUT_SECONDS})
         return response.text
     except Exception as e:
         print(f"GenAI Error: {e}")
@@ -1,5 +1,6 @@
 import uuid
 from database import get_db_connection
+from services.routing_service import refresh_doctor_counts
 
 def add_doctor(name: str, department_id: str):
     conn = get_db_connection()
@@ -12,6 +13,7 @@ def add_doctor(name: str, department_id: str):
             (doctor_id, name, department_id)
         )
         conn.commit()
+        refresh_doctor_counts()
         return {"id": doctor_id, "name": name, "department_id": department_id, "is_active": True}
     except Exception as e:
         print(f"Error adding doctor: {e}")
@@ -29,6 +31,7 @@ def toggle_doctor_activation(doctor_id: str, is_active: bool):
             (is_active, doctor_id)
         )
         conn.commit()
+        refresh_doctor_counts()
         return True
     except Exception as e:
         print(f"Error toggling doctor: {e}")
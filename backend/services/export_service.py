@@ -0,0 +1,82 @@
+import csv
+import io
+import json
+from database import get_db_connection
+
+EXPORT_BATCH_SIZE = 500
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_COLUMNS = [
+    "id", "patient_code", "name", "age", "gender", "symptoms", "vitals",
+    "risk_level", "recommended_department", "assigned_department",
+    "status", "priority_weight", "created_at"
+]
+
+# Rows that have left the live queue
+ARCHIVED_STATUSES = ("discharged", "completed")
+
+def _export_query(start: str = None, end: str = None, department: str = None, include_archived: bool = False,
+                  after: tuple = None, limit: int = EXPORT_BATCH_SIZE):
+    """
+    One page of the export, in (created_at, rowid) order; rowid is the last column.
+    start/end: 'YYYY-MM-DD HH:MM:SS' bounds on created_at (start inclusive, end exclusive)
+    after: (created_at, rowid) of the previous page's last row
+    """
+    sql = f"SELECT {', '.join(EXPORT_COLUMNS)}, rowid FROM patients WHERE 1 = 1"
+    params = []
+    if after:
+        sql += " AND (created_at > ? OR (created_at = ? AND rowid > ?))"
+        params.extend([after[0], after[0], after[1]])
+    if start:
+        sql += " AND created_at >= ?"
+        params.append(start)
+    if end:
+        sql += " AND created_at < ?"
+        params.append(end)
+    if department:
+        sql += " AND assigned_department = ?"
+        params.append(department)
+    if not include_archived:
+        sql += f" AND status NOT IN ({', '.join('?' * len(ARCHIVED_STATUSES))})"
+        params.extend(ARCHIVED_STATUSES)
+    sql += " ORDER BY created_at ASC, rowid ASC LIMIT ?"
+    params.append(limit)
+    return sql, params
+
+def _csv_chunk(rows, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(tuple(row) for row in rows)
+    return buffer.getvalue()
+
+def _ndjson_chunk(rows) -> str:
+    return "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in rows)
+
+def iter_patient_export(fmt: str = "csv", start: str = None, end: str = None, department: str = None,
+                        include_archived: bool = False, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Streams patient rows as CSV or NDJSON text chunks.
+    Rows are read `batch_size` at a time with keyset pages, so memory stays flat
+    whatever the date range. Each page is a short query on its own connection:
+    no read transaction stays open while a slow client drains the stream, so
+    admissions and discharges aren't locked out (rollback journal) meanwhile.
+    """
+    format_chunk = _ndjson_chunk if fmt == "ndjson" else _csv_chunk
+
+    if fmt == "csv":
+        yield _csv_chunk([], header=True)
+    after = None
+    while True:
+        sql, params = _export_query(start, end, department, include_archived, after, batch_size)
+        conn = get_db_connection()
+        try:
+            rows = [tuple(row) for row in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+        if not rows:
+            break
+        after = (rows[-1][EXPORT_COLUMNS.index("created_at")], rows[-1][-1])
+        yield format_chunk([row[:-1] for row in rows])
+        if len(rows) < batch_size:
+            break
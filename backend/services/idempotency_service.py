@@ -0,0 +1,108 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from database import get_facility
+
+# Explicit Idempotency-Key headers are remembered longer than payload hashes:
+# two genuinely different patients can share a payload, a client key can't collide.
+IDEMPOTENCY_KEY_TTL_SECONDS = 3600
+PAYLOAD_HASH_TTL_SECONDS = 60
+IDEMPOTENCY_MAX_ENTRIES = 10000  # per facility
+
+class IdempotencyKeyReused(Exception):
+    """
+    The key was already used for a different payload.
+    """
+
+class _Entry:
+    def __init__(self, fingerprint):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+        self.fingerprint = fingerprint
+        self.expires_at = None  # set once the computation finishes
+
+# One store per facility:
+# {facility: {"entries": {key: _Entry}, "expiry": {ttl: OrderedDict(key -> _Entry)}}}
+# Every key in an expiry queue shares the ttl and was appended when it finished,
+# so each queue is ordered by expires_at and eviction only looks at the fronts.
+_stores = {}
+_lock = threading.Lock()
+
+def payload_key(payload: dict) -> str:
+    """
+    Content hash of a request payload (key order doesn't matter).
+    """
+    canonical = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def _pop_oldest(store: dict, queue: OrderedDict):
+    key, entry = queue.popitem(last=False)
+    if store["entries"].get(key) is entry:
+        del store["entries"][key]
+
+def _evict(store: dict, now: float):
+    """
+    Drops expired entries, then the finished ones closest to expiry while over capacity.
+    In-flight entries are never evicted. Caller must hold _lock.
+    """
+    for queue in store["expiry"].values():
+        while queue and next(iter(queue.values())).expires_at <= now:
+            _pop_oldest(store, queue)
+
+    while len(store["entries"]) > IDEMPOTENCY_MAX_ENTRIES:
+        queues = [q for q in store["expiry"].values() if q]
+        if not queues:
+            break
+        _pop_oldest(store, min(queues, key=lambda q: next(iter(q.values())).expires_at))
+
+def run_once(key: str, compute, ttl: float = IDEMPOTENCY_KEY_TTL_SECONDS, fingerprint: str = None):
+    """
+    Runs compute() once per key within ttl.
+    - Duplicate after completion -> stored result
+    - Concurrent duplicate -> waits for the in-flight call
+    - Failed call -> not stored, waiters retry
+    - Same key, different fingerprint (payload hash) -> IdempotencyKeyReused
+    Keys are scoped to the current facility.
+    Returns (result, replayed).
+    """
+    with _lock:
+        store = _stores.setdefault(get_facility(), {"entries": {}, "expiry": {}})
+
+    while True:
+        with _lock:
+            now = time.monotonic()
+            _evict(store, now)
+            entry = store["entries"].get(key)
+            owner = entry is None
+            if owner:
+                entry = _Entry(fingerprint)
+                store["entries"][key] = entry
+
+        if not owner and entry.fingerprint != fingerprint:
+            raise IdempotencyKeyReused(key)
+        if owner:
+            break
+
+        entry.done.wait()
+        if not entry.failed:
+            return entry.result, True
+
+    try:
+        result = compute()
+    except Exception:
+        with _lock:
+            if store["entries"].get(key) is entry:
+                del store["entries"][key]
+        entry.failed = True
+        entry.done.set()
+        raise
+
+    entry.result = result
+    with _lock:
+        entry.expires_at = time.monotonic() + ttl
+        store["expiry"].setdefault(ttl, OrderedDict())[key] = entry
+    entry.done.set()
+    return result, False
@@ -0,0 +1,110 @@
+import json
+import re
+import pandas as pd
+from model_service import predict_risk_batch
+from services.patient_service import admit_patients
+
+BP_PATTERN = re.compile(r"^\d+/\d+$")
+DEFAULT_CHUNK_SIZE = 500
+
+def _validate_row(row: dict):
+    """
+    Returns an error message, or None if the row can be triaged.
+    Mirrors what predict_risk's preprocessing can handle.
+    """
+    age = pd.to_numeric(row.get("Age"), errors="coerce")
+    if pd.isna(age) or not 0 < age <= 100:
+        return "Age must be a number between 1 and 100"
+    if not BP_PATTERN.match(str(row.get("Blood Pressure") or "").strip()):
+        return "Blood Pressure must look like 120/80"
+    if row.get("Gender") not in ("Female", "Male"):
+        return "Gender must be Female or Male"
+    if not row.get("Symptoms"):
+        return "Symptoms missing"
+    return None
+
+def _triage_chunk(records: list, use_llm: bool, explain: bool):
+    """
+    1. Validate rows
+    2. Batched inference for the valid ones
+    3. Admit them in one transaction
+    Returns one result dict per input row, in order.
+    """
+    results = [None] * len(records)
+    valid = []
+    for i, row in enumerate(records):
+        error = _validate_row(row)
+        if error:
+            results[i] = {"status": "error", "error": error}
+        else:
+            row["Blood Pressure"] = str(row["Blood Pressure"]).strip()
+            valid.append(i)
+
+    if not valid:
+        return results
+
+    try:
+        predictions = predict_risk_batch([records[i] for i in valid], use_llm=use_llm, explain=explain)
+        admissions = admit_patients([
+            (records[i], p["risk_level"], p["recommended_dept"])
+            for i, p in zip(valid, predictions)
+        ])
+    except Exception as e:
+        print(f"Error in bulk intake chunk: {e}")
+        for i in valid:
+            results[i] = {"status": "error", "error": "Triage failed for this batch"}
+        return results
+
+    for i, p, a in zip(valid, predictions, admissions):
+        results[i] = {
+            "status": "admitted",
+            "patient_id": a["id"],
+            "patient_code": a["patient_code"],
+            "risk_level": p["risk_level"],
+            "confidence": p["confidence"],
+            "recommended_dept": p["recommended_dept"],
+            "assigned_dept": a["assigned_dept"],
+            "priority_weight": a["priority"],
+            "safety_advice": p["safety_advice"],
+            "degraded": p["degraded"]
+        }
+        if explain:
+            results[i]["explanation"] = p["explanation"]
+    return results
+
+def iter_bulk_intake(csv_file, chunk_size: int = DEFAULT_CHUNK_SIZE, use_llm: bool = False, explain: bool = False):
+    """
+    Streams a patient_data.csv-format file (path or file object) through triage + admission.
+    Reads `chunk_size` rows at a time, so memory doesn't grow with the file.
+    Yields one result dict per row; "row" is the 1-based data row number.
+    A malformed file (e.g. a row with too many fields) ends the stream with one
+    error line pointing at the first row that wasn't processed.
+    """
+    row_number = 0
+    try:
+        chunks = pd.read_csv(csv_file, chunksize=chunk_size)
+    except ValueError as e:  # empty file, bad encoding
+        yield {"row": row_number + 1, "status": "error", "error": f"Could not parse CSV: {str(e).strip()}"}
+        return
+
+    while True:
+        try:
+            chunk = next(chunks, None)
+        except ValueError as e:  # pd.errors.ParserError, bad encoding
+            yield {"row": row_number + 1, "status": "error", "error": f"Could not parse CSV: {str(e).strip()}"}
+            return
+        if chunk is None:
+            return
+        if "Symptom" in chunk.columns:
+            chunk = chunk.rename(columns={"Symptom": "Symptoms"})
+        # NaN -> None so missing fields behave like missing JSON keys
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        records = chunk.to_dict("records")
+
+        for result in _triage_chunk(records, use_llm, explain):
+            row_number += 1
+            yield {"row": row_number, **result}
+
+def to_ndjson(results):
+    for result in results:
+        yield json.dumps(result) + "\n"
@@ -0,0 +1,98 @@
+from concurrent.futures import ThreadPoolExecutor
+from database import list_facilities, facility_context
+from services.queue_service import get_department_stats, get_overall_queue_stats, get_analytics_data
+
+# Cross-facility analytics: query every shard in parallel, then merge.
+# Covers only the facilities in THIS instance's shard map (all on this host, see
+# database.py). Facilities served by other instances are not included; responses
+# say so with "scope": "instance".
+MAX_FANOUT_WORKERS = 8
+
+def _facility_stats(facility: str):
+    with facility_context(facility):
+        return {
+            "departments": get_department_stats(),
+            "queue": get_overall_queue_stats()
+        }
+
+def _facility_analytics(facility: str):
+    with facility_context(facility):
+        return get_analytics_data()
+
+def _fan_out(fetch, what: str):
+    """
+    Runs fetch(facility) for every facility in parallel.
+    A facility whose shard fails is reported with an error instead of failing the whole call.
+    """
+    facilities = list_facilities()
+    per_facility = {}
+    with ThreadPoolExecutor(max_workers=min(MAX_FANOUT_WORKERS, len(facilities))) as pool:
+        futures = {facility: pool.submit(fetch, facility) for facility in facilities}
+        for facility, future in futures.items():
+            try:
+                per_facility[facility] = future.result()
+            except Exception as e:
+                print(f"Error fetching {what} for facility {facility}: {e}")
+                per_facility[facility] = {"error": "Shard unavailable"}
+    return per_facility
+
+def _sum_by_name(series_lists):
+    """
+    Merges [{"name", "value"}, ...] series, summing values with the same name.
+    """
+    totals = {}
+    for series in series_lists:
+        for point in series:
+            totals[point["name"]] = totals.get(point["name"], 0) + point["value"]
+    return [{"name": name, "value": value} for name, value in totals.items()]
+
+def get_network_stats():
+    """
+    Per-facility dashboard stats plus totals, for this instance's facilities only.
+    """
+    per_facility = _fan_out(_facility_stats, "stats")
+
+    # Merge
+    queue = {"total_waiting": 0, "high_risk_waiting": 0}
+    departments = {}
+    for stats in per_facility.values():
+        if "error" in stats:
+            continue
+        for key in queue:
+            queue[key] += stats["queue"][key]
+        for name, dept in stats["departments"].items():
+            merged = departments.setdefault(name, {"active_doctors": 0, "waiting_patients": 0})
+            merged["active_doctors"] += dept["active_doctors"]
+            merged["waiting_patients"] += dept["waiting_patients"]
+
+    return {
+        "scope": "instance",
+        "facilities": per_facility,
+        "totals": {
+            "queue": queue,
+            "departments": departments
+        }
+    }
+
+def get_network_analytics():
+    """
+    Per-facility /dashboard/analytics plus summed risk distribution and department load,
+    for this instance's facilities only.
+    """
+    per_facility = _fan_out(_facility_analytics, "analytics")
+    available = [a for a in per_facility.values() if "error" not in a]
+
+    totals = {
+        "risk_distribution": _sum_by_name(a["risk_distribution"] for a in available),
+        "department_load": _sum_by_name(a["department_load"] for a in available)
+    }
+    if available:
+        # Static chart series, same for every facility
+        totals["patient_attendance"] = available[0]["patient_attendance"]
+        totals["model_accuracy"] = available[0]["model_accuracy"]
+
+    return {
+        "scope": "instance",
+        "facilities": per_facility,
+        "totals": totals
+    }
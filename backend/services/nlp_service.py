@@ -10,6 +10,9 @@ genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
 model = genai.GenerativeModel("gemini-2.5-flash")
 
+# Deadline for one Gemini call: a hung request must not hold an admission gate slot.
+LLM_TIMEOUT_SECONDS = 8
+
 CONTROLLED_SYMPTOMS = [
     "chest pain",
     "breathlessness",
@@ -23,7 +26,31 @@ CONTROLLED_SYMPTOMS = [
     "sweating",
 ]
 
+# Keyword fallback for bulk/offline use (no LLM call).
+# Mirrors the str.contains flags used in train_model.py.
+LOCAL_SYMPTOM_KEYWORDS = {
+    "chest pain": ["chest pain", "chest tightness", "tightness in chest"],
+    "breathlessness": ["breath"],
+    "fever": ["fever", "feverish"],
+    "confusion": ["confusion", "confused", "disoriented"],
+    "headache": ["headache", "migraine"],
+    "nausea": ["nausea", "nauseous"],
+    "vomiting": ["vomit"],
+    "blurred vision": ["blurred vision", "blurry vision"],
+    "dizziness": ["dizz", "faint", "lightheaded"],
+    "sweating": ["sweat"],
+}
+
+def extract_symptoms_local(user_text: str):
+    text = str(user_text or "").lower()
+    return [symptom for symptom, keywords in LOCAL_SYMPTOM_KEYWORDS.items()
+            if any(k in text for k in keywords)]
+
 def extract_symptoms(user_text: str):
+    """
+    Gemini symptom extraction. Returns None if the call fails or times out,
+    so the caller can fall back to extract_symptoms_local.
+    """
     prompt = f"""
     You are a medical AI assistant. Your task is to extract standardized symptoms from patient descriptions.
     
@@ -44,7 +71,7 @@ def extract_symptoms(user_text: str):
     """
 
     try:
-        response = model.generate_content(prompt)
+        response = model.generate_content(prompt, request_options={"timeout": LLM_TIMEOUT_SECONDS})
         # Clean up potential markdown formatting in response (e.g. ```python ... ```)
         text = response.text.strip()
         if text.startswith("```"):
@@ -53,7 +80,10 @@ def extract_symptoms(user_text: str):
                 text = text.rsplit("\n", 1)[0]
         
         extracted = eval(text.strip())
+        if not isinstance(extracted, list):
+            raise ValueError(f"expected a list, got {type(extracted).__name__}")
         return extracted
-    except Exception:
-        # Fallback: never let API failure crash prediction
-        return []
+    except Exception as e:
+        # Never let API failure crash prediction
+        print(f"Symptom extraction failed: {e}")
+        return None
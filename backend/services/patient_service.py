@@ -1,7 +1,8 @@
+import json
 import uuid
 from datetime import datetime
-from database import get_db_connection
-from services.doctor_service import get_active_doctors_count
+from database import get_db_connection, next_sequence_values, format_patient_code, PATIENT_CODE_SEQUENCE
+from services.routing_service import route_patient, record_admission, record_discharge
 
 # Priority Map
 # Critical -> 3, High -> 2, Medium -> 1, Low -> 0
@@ -13,79 +14,119 @@ PRIORITY_MAP = {
     "Stable": 0
 }
 
+INSERT_PATIENT_SQL = '''
+    INSERT INTO patients 
+    (id, patient_code, risk_level, recommended_department, assigned_department, status, priority_weight, name, age, gender, symptoms, vitals)
+    VALUES (?, ?, ?, ?, ?, 'waiting', ?, ?, ?, ?, ?, ?)
+'''
+
+def _priority_weight(risk_level: str) -> int:
+    # Map risk_level casing if needed (e.g. 'High Risk' -> 'High')
+    # Assuming exact match for now or partial
+    for key, weight in PRIORITY_MAP.items():
+        if key.upper() in risk_level.upper():
+            return weight
+    return 0
+
+def _patient_row(patient_data: dict, risk_level: str, recommended_dept: str, assigned_dept: str, p_weight: int,
+                 patient_code: str):
+    """
+    Builds the patients INSERT params and the admission result.
+    """
+    patient_id = str(uuid.uuid4())
+    
+    # Extract fields
+    name = patient_data.get("Name") or "Unknown"
+    age = patient_data.get("Age")
+    gender = patient_data.get("Gender")
+    symptoms = patient_data.get("Symptoms")
+    
+    # Format Vitals
+    vitals = f"BP: {patient_data.get('Blood Pressure', '--')}, HR: {patient_data.get('Heart Rate', '--')}, Temp: {patient_data.get('Temperature', '--')}"
+
+    params = (patient_id, patient_code, risk_level, recommended_dept, assigned_dept, p_weight, name, age, gender, symptoms, vitals)
+    result = {
+        "id": patient_id,
+        "patient_code": patient_code,
+        "risk_level": risk_level,
+        "assigned_dept": assigned_dept,
+        "priority": p_weight,
+        "original_dept": recommended_dept
+    }
+    return params, result
+
 def admit_patient(patient_data: dict, risk_level: str, recommended_dept: str):
     """
     1. Calculate Priority
-    2. Check Dept Availability (Active Doctors > 0)
-    3. Assign Dept (Re-route if needed)
-    4. Save to DB
+    2. Route to the eligible dept with the lowest expected wait (see routing_service)
+    3. Save to DB
+    4. Update in-memory dept load
     """
     
     # 1. Priority
-    # Map risk_level casing if needed (e.g. 'High Risk' -> 'High')
-    # Assuming exact match for now or partial
-    p_weight = 0
-    for key, weight in PRIORITY_MAP.items():
-        if key.upper() in risk_level.upper():
-            p_weight = weight
-            break
+    p_weight = _priority_weight(risk_level)
             
-    # 2. Routing Logic
-    assigned_dept = recommended_dept
+    # 2. Routing Logic (load-aware)
+    assigned_dept = route_patient(recommended_dept, p_weight)
     
-    # Needs: Dept ID for 'recommended_dept' string to check doctors
     conn = get_db_connection()
     cursor = conn.cursor()
     
     try:
-        cursor.execute("SELECT id FROM departments WHERE name = ?", (recommended_dept,))
-        row = cursor.fetchone()
+        # 3. Create Patient (sequence-based code P-000123)
+        code_num = next_sequence_values(cursor, PATIENT_CODE_SEQUENCE)[0]
+        params, result = _patient_row(patient_data, risk_level, recommended_dept, assigned_dept, p_weight,
+                                      format_patient_code(code_num))
+        cursor.execute(INSERT_PATIENT_SQL, params)
         
-        if row:
-            dept_id = row['id']
-            # Check Active Doctors
-            active_docs = get_active_doctors_count(dept_id)
-            
-            if active_docs == 0:
-                assigned_dept = "General" # Fallback
-                # Optional: Append " (Re-routed)" for UI clariy
-        else:
-            # If dept doesn't match known DB depts, maybe map to General
-            assigned_dept = "General"
-
-        # 3. Create Patient
-        patient_id = str(uuid.uuid4())
-        patient_code = f"P-{str(uuid.uuid4())[:4].upper()}" # Gen random code P-XXXX
+        conn.commit()
+        record_admission(assigned_dept, p_weight)
         
-        # Extract fields
-        name = patient_data.get("Name") or "Unknown"
-        age = patient_data.get("Age")
-        gender = patient_data.get("Gender")
-        symptoms = patient_data.get("Symptoms")
+        return result
         
-        # Format Vitals
-        vitals = f"BP: {patient_data.get('Blood Pressure', '--')}, HR: {patient_data.get('Heart Rate', '--')}, Temp: {patient_data.get('Temperature', '--')}"
+    except Exception as e:
+        print(f"Error admitting patient: {e}")
+        conn.rollback()
+        raise e
+    finally:
+        conn.close()
 
-        cursor.execute('''
-            INSERT INTO patients 
-            (id, patient_code, risk_level, recommended_department, assigned_department, status, priority_weight, name, age, gender, symptoms, vitals)
-            VALUES (?, ?, ?, ?, ?, 'waiting', ?, ?, ?, ?, ?, ?)
-        ''', (patient_id, patient_code, risk_level, recommended_dept, assigned_dept, p_weight, name, age, gender, symptoms, vitals))
+def admit_patients(admissions: list):
+    """
+    Batched admit_patient: one connection, one transaction.
+    admissions: [(patient_data, risk_level, recommended_dept), ...]
+    Each patient is routed against the load left by the ones before it.
+    """
+    routed = []
+    rows = []
+    results = []
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        codes = next_sequence_values(cursor, PATIENT_CODE_SEQUENCE, len(admissions))
+        for (patient_data, risk_level, recommended_dept), code_num in zip(admissions, codes):
+            p_weight = _priority_weight(risk_level)
+            assigned_dept = route_patient(recommended_dept, p_weight)
+            record_admission(assigned_dept, p_weight)
+            routed.append((assigned_dept, p_weight))
+            
+            params, result = _patient_row(patient_data, risk_level, recommended_dept, assigned_dept, p_weight,
+                                          format_patient_code(code_num))
+            rows.append(params)
+            results.append(result)
         
+        cursor.executemany(INSERT_PATIENT_SQL, rows)
         conn.commit()
-        
-        return {
-            "id": patient_id,
-            "patient_code": patient_code,
-            "risk_level": risk_level,
-            "assigned_dept": assigned_dept,
-            "priority": p_weight,
-            "original_dept": recommended_dept
-        }
+        return results
         
     except Exception as e:
-        print(f"Error admitting patient: {e}")
+        print(f"Error admitting patients: {e}")
         conn.rollback()
+        # Undo the load we reserved
+        for assigned_dept, p_weight in routed:
+            record_discharge(assigned_dept, p_weight)
         raise e
     finally:
         conn.close()
@@ -115,7 +156,10 @@ def discharge_patient(patient_id: str):
     cursor = conn.cursor()
     try:
         # Check if exists
-        cursor.execute("SELECT id FROM patients WHERE patient_code = ? OR id = ?", (patient_id, patient_id))
+        cursor.execute(
+            "SELECT id, status, assigned_department, priority_weight FROM patients WHERE patient_code = ? OR id = ?",
+            (patient_id, patient_id)
+        )
         row = cursor.fetchone()
         if not row:
             return False
@@ -129,6 +173,8 @@ def discharge_patient(patient_id: str):
         ''', (real_id,))
         
         conn.commit()
+        if row['status'] == 'waiting':
+            record_discharge(row['assigned_department'], row['priority_weight'])
         return True
     except Exception as e:
         print(f"Error discharging patient: {e}")
@@ -136,3 +182,43 @@ def discharge_patient(patient_id: str):
         return False
     finally:
         conn.close()
+
+def discharge_patients(patient_ids: list):
+    """
+    Bulk discharge (end-of-shift cleanup): one UPDATE, one transaction.
+    Accepts patient IDs and/or patient codes.
+    Returns discharged IDs and the inputs that matched no waiting patient.
+    """
+    if not patient_ids:
+        return {"discharged": [], "not_found": []}
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        # json_each keeps it one statement however many IDs (no bound-parameter limit)
+        ids_json = json.dumps(list(patient_ids))
+        cursor.execute('''
+            UPDATE patients 
+            SET status = 'discharged' 
+            WHERE status = 'waiting'
+            AND (id IN (SELECT value FROM json_each(?)) OR patient_code IN (SELECT value FROM json_each(?)))
+            RETURNING id, patient_code, assigned_department, priority_weight
+        ''', (ids_json, ids_json))
+        rows = cursor.fetchall()
+        conn.commit()
+    except Exception as e:
+        print(f"Error discharging patients: {e}")
+        conn.rollback()
+        raise e
+    finally:
+        conn.close()
+
+    matched = set()
+    for row in rows:
+        record_discharge(row['assigned_department'], row['priority_weight'])
+        matched.update((row['id'], row['patient_code']))
+
+    return {
+        "discharged": [row['id'] for row in rows],
+        "not_found": [pid for pid in patient_ids if pid not in matched]
+    }
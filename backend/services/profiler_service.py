@@ -0,0 +1,212 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+# On-demand sampling profiler for production requests.
+# While a sampled request to the chosen endpoint is in flight, a background thread
+# snapshots thread stacks every interval_ms (sys._current_frames) and keeps:
+# - worker threads running the endpoint function (preprocessing, XGBoost, sqlite3, ...)
+# - the event loop thread, when busy (response/JSON encoding), under "[event-loop]"
+# Concurrent unsampled requests to the same endpoint can show up too; numbers are approximate.
+
+MAX_STACK_DEPTH = 128
+
+_lock = threading.Lock()
+_session = None
+_work = threading.Event()
+
+# Event loop frames that mean "idle, waiting for I/O"
+_IDLE_LEAVES = {"select", "poll", "epoll", "kqueue", "_run_once", "run_forever"}
+
+def _frame_label(code) -> str:
+    parts = code.co_filename.replace("\\", "/").split("/")
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+def _stack(frame):
+    """
+    Root-first list of frame labels.
+    """
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+def _contains_code(frame, code) -> bool:
+    while frame is not None:
+        if frame.f_code is code:
+            return True
+        frame = frame.f_back
+    return False
+
+def _sample(endpoint_code, loop_threads):
+    """
+    One snapshot of every thread's stack. Runs without _lock so requests never wait on it.
+    """
+    own_thread = threading.get_ident()
+    stacks = []
+    for thread_id, frame in sys._current_frames().items():
+        if thread_id == own_thread:
+            continue
+        if _contains_code(frame, endpoint_code):
+            stacks.append(tuple(_stack(frame)))
+        elif thread_id in loop_threads and frame.f_code.co_name not in _IDLE_LEAVES:
+            stacks.append(("[event-loop]",) + tuple(_stack(frame)))
+    return stacks
+
+def _sampler_loop(session):
+    interval = session["interval_ms"] / 1000
+    while True:
+        with _lock:
+            if _session is not session or time.time() >= session["ends_at"]:
+                session["running"] = False
+                return
+            busy = session["in_flight"] > 0
+            loop_threads = set(session["loop_threads"])
+        if busy:
+            stacks = _sample(session["endpoint_code"], loop_threads)
+            with _lock:
+                session["stacks"].update(stacks)
+                session["samples"] += 1
+            time.sleep(interval)
+        else:
+            _work.wait(0.5)
+            _work.clear()
+
+def start_session(endpoint: str, path_regex, endpoint_code, sample_rate: float,
+                  duration_seconds: float, interval_ms: float):
+    """
+    Starts a profiling window, replacing any previous session and its data.
+    """
+    global _session
+    now = time.time()
+    session = {
+        "endpoint": endpoint,
+        "path_regex": path_regex,
+        "endpoint_code": endpoint_code,
+        "sample_rate": sample_rate,
+        "interval_ms": interval_ms,
+        "started_at": now,
+        "ends_at": now + duration_seconds,
+        "in_flight": 0,
+        "loop_threads": set(),
+        "requests_seen": 0,
+        "requests_profiled": 0,
+        "samples": 0,
+        "stacks": Counter(),
+        "running": True
+    }
+    with _lock:
+        _session = session
+    threading.Thread(target=_sampler_loop, args=(session,), daemon=True, name="triagex-profiler").start()
+    _work.set()
+    return get_session_status()
+
+def stop_session():
+    with _lock:
+        if _session is not None:
+            _session["ends_at"] = min(_session["ends_at"], time.time())
+    _work.set()
+    return get_session_status()
+
+def get_session_status():
+    with _lock:
+        if _session is None:
+            return {"active": False}
+        return {
+            "active": _session["running"] and time.time() < _session["ends_at"],
+            "endpoint": _session["endpoint"],
+            "sample_rate": _session["sample_rate"],
+            "interval_ms": _session["interval_ms"],
+            "started_at": _session["started_at"],
+            "ends_at": _session["ends_at"],
+            "requests_seen": _session["requests_seen"],
+            "requests_profiled": _session["requests_profiled"],
+            "samples": _session["samples"],
+            "distinct_stacks": len(_session["stacks"])
+        }
+
+def begin_request(path: str):
+    """
+    Called per request. Returns the session if this request is sampled, else None.
+    Only requests to the profiled endpoint, during a session, take _lock.
+    """
+    session = _session
+    if session is None or time.time() >= session["ends_at"]:
+        return None
+    if not session["path_regex"].match(path):
+        return None
+    with _lock:
+        session["requests_seen"] += 1
+        if random.random() >= session["sample_rate"]:
+            return None
+        session["requests_profiled"] += 1
+        session["in_flight"] += 1
+        session["loop_threads"].add(threading.get_ident())
+    _work.set()
+    return session
+
+def end_request(session):
+    with _lock:
+        session["in_flight"] -= 1
+
+def _snapshot():
+    with _lock:
+        if _session is None:
+            return None
+        return dict(_session, stacks=Counter(_session["stacks"]))
+
+def export_collapsed() -> str:
+    """
+    Brendan Gregg collapsed stacks: "root;child;leaf count" per line.
+    """
+    session = _snapshot()
+    if session is None:
+        return ""
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in session["stacks"].most_common())
+
+def export_speedscope() -> dict:
+    """
+    speedscope "sampled" profile (https://www.speedscope.app/file-format-schema.json).
+    Weights are in milliseconds (samples * interval).
+    """
+    session = _snapshot()
+    if session is None:
+        return {}
+
+    frames, frame_index = [], {}
+    samples, weights = [], []
+    for stack, count in session["stacks"].most_common():
+        indices = []
+        for label in stack:
+            if label not in frame_index:
+                frame_index[label] = len(frames)
+                frames.append({"name": label})
+            indices.append(frame_index[label])
+        samples.append(indices)
+        weights.append(count * session["interval_ms"])
+
+    name = f"TriageX {session['endpoint']}"
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "triagex-profiler",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights
+        }]
+    }
+
+def admin_token():
+    return os.getenv("TRIAGEX_ADMIN_TOKEN")
@@ -0,0 +1,181 @@
+import threading
+from database import get_db_connection, get_facility
+
+# Clinically eligible departments per ML recommendation.
+# The recommended department should stay first; overflow goes to the others.
+ELIGIBILITY_RULES = {
+    "Cardiology": ["Cardiology", "General"],
+    "Neurology": ["Neurology", "General"],
+    "Orthopedics": ["Orthopedics", "General"],
+    "Pediatrics": ["Pediatrics", "General"],
+    "General": ["General"],
+}
+DEFAULT_ELIGIBLE = ["General"]
+FALLBACK_DEPT = "General"
+
+# Overflow Thresholds (minutes of expected wait in the recommended dept)
+# Critical -> 3, High -> 2, Medium -> 1, Low -> 0
+OVERFLOW_THRESHOLDS = {
+    3: 10,
+    2: 20,
+    1: 45,
+    0: 60
+}
+
+# In-memory load per facility, keyed by department name:
+# {facility: {dept_name: {id, avg_service_time, active_doctors, waiting: {priority: count}}}}
+_loads = {}
+_lock = threading.Lock()
+
+def configure_routing(eligibility: dict = None, overflow_thresholds: dict = None):
+    """
+    Overrides eligibility rules and/or overflow thresholds.
+    """
+    with _lock:
+        if eligibility is not None:
+            ELIGIBILITY_RULES.clear()
+            ELIGIBILITY_RULES.update(eligibility)
+        if overflow_thresholds is not None:
+            OVERFLOW_THRESHOLDS.clear()
+            OVERFLOW_THRESHOLDS.update(overflow_thresholds)
+
+def reset_routing_state():
+    """
+    Drops the in-memory load (all facilities) so it is rebuilt from the DB on next use.
+    """
+    with _lock:
+        _loads.clear()
+
+def _count_active_doctors(cursor):
+    cursor.execute('''
+        SELECT department_id, count(*) FROM doctors
+        WHERE is_active = 1
+        GROUP BY department_id
+    ''')
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+def _load_state():
+    """
+    Current facility's load, built from its DB on first use:
+    departments, active doctors, waiting patients per priority.
+    Caller must hold _lock.
+    """
+    facility = get_facility()
+    if facility in _loads:
+        return _loads[facility]
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, name, avg_service_time FROM departments")
+        depts = cursor.fetchall()
+        active = _count_active_doctors(cursor)
+
+        load = {}
+        for dept in depts:
+            load[dept['name']] = {
+                "id": dept['id'],
+                "avg_service_time": dept['avg_service_time'],
+                "active_doctors": active.get(dept['id'], 0),
+                "waiting": {}
+            }
+
+        cursor.execute('''
+            SELECT assigned_department, priority_weight, count(*) FROM patients
+            WHERE status = 'waiting'
+            GROUP BY assigned_department, priority_weight
+        ''')
+        for name, priority, count in cursor.fetchall():
+            if name in load:
+                load[name]["waiting"][priority or 0] = count
+
+        _loads[facility] = load
+        return load
+    finally:
+        conn.close()
+
+def _expected_wait(dept: dict, priority: int):
+    """
+    (Patients ahead * Avg Service Time) / Active Doctors
+    Patients ahead = everyone waiting with priority >= ours.
+    Returns None if no active doctors.
+    """
+    if dept["active_doctors"] == 0:
+        return None
+    ahead = sum(count for p, count in dept["waiting"].items() if p >= priority)
+    return (ahead * dept["avg_service_time"]) / dept["active_doctors"]
+
+def route_patient(recommended_dept: str, priority: int) -> str:
+    """
+    1. Stay in the recommended dept while its expected wait is under the overflow threshold
+    2. Otherwise pick the eligible dept with the lowest expected wait
+    3. No eligible dept has active doctors -> General
+    """
+    with _lock:
+        load = _load_state()
+        eligible = ELIGIBILITY_RULES.get(recommended_dept, DEFAULT_ELIGIBLE)
+
+        home = load.get(recommended_dept)
+        if home is not None:
+            home_wait = _expected_wait(home, priority)
+            threshold = OVERFLOW_THRESHOLDS.get(priority, 0)
+            if home_wait is not None and home_wait <= threshold:
+                return recommended_dept
+
+        best_dept, best_wait = None, None
+        for name in eligible:
+            dept = load.get(name)
+            if dept is None:
+                continue
+            wait = _expected_wait(dept, priority)
+            if wait is None:
+                continue
+            if best_wait is None or wait < best_wait:
+                best_dept, best_wait = name, wait
+
+        return best_dept or FALLBACK_DEPT
+
+def record_admission(dept_name: str, priority: int):
+    with _lock:
+        load = _load_state()
+        if dept_name in load:
+            waiting = load[dept_name]["waiting"]
+            waiting[priority] = waiting.get(priority, 0) + 1
+
+def record_discharge(dept_name: str, priority: int):
+    with _lock:
+        load = _load_state()
+        if dept_name in load:
+            waiting = load[dept_name]["waiting"]
+            waiting[priority] = max(waiting.get(priority, 0) - 1, 0)
+
+def refresh_doctor_counts():
+    """
+    Re-reads active doctor counts after a doctor is added or toggled.
+    """
+    with _lock:
+        load = _loads.get(get_facility())
+        if load is None:
+            return
+        conn = get_db_connection()
+        try:
+            active = _count_active_doctors(conn.cursor())
+        finally:
+            conn.close()
+        for dept in load.values():
+            dept["active_doctors"] = active.get(dept["id"], 0)
+
+def get_routing_snapshot():
+    """
+    Current load per department, with expected wait per priority.
+    """
+    with _lock:
+        load = _load_state()
+        return {
+            name: {
+                "active_doctors": dept["active_doctors"],
+                "waiting_patients": sum(dept["waiting"].values()),
+                "expected_wait": {p: _expected_wait(dept, p) for p in sorted(OVERFLOW_THRESHOLDS)}
+            }
+            for name, dept in load.items()
+        }
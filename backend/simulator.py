@@ -0,0 +1,300 @@
+import argparse
+import contextlib
+import csv
+import heapq
+import io
+import json
+import os
+import random
+from datetime import datetime
+
+import database
+from database import get_db_connection, init_db, use_database
+from services.doctor_service import add_doctor, toggle_doctor_activation
+from services.patient_service import admit_patient, discharge_patient
+from services.routing_service import reset_routing_state
+
+# Discrete-event ER simulator.
+# Replays arrivals through the real admit_patient routing and discharge_patient,
+# in virtual time (minutes), against a shared in-memory DB.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(BASE_DIR, "patient_data.csv")
+SIM_DB_URI = "file:triagex_sim?mode=memory&cache=shared"
+
+# Doctors per department. Either a fixed count or daily shifts:
+# [(start_hour, end_hour, doctors), ...]
+DEFAULT_ROSTER = {
+    "Cardiology": 2,
+    "Neurology": 1,
+    "Orthopedics": 1,
+    "General": 2,
+    "Pediatrics": 1
+}
+
+def load_cases(path: str = DATA_PATH):
+    """
+    Patient cases in patient_data.csv format.
+    Risk_Level / Recommended_Dept labels stand in for the model output.
+    """
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+def load_arrivals(path: str):
+    """
+    Historical arrival stream: patient_data.csv columns plus Arrival_Time (ISO timestamp).
+    Returns [(minute, case), ...] relative to the first arrival.
+    """
+    cases = load_cases(path)
+    stamps = [datetime.fromisoformat(c["Arrival_Time"]) for c in cases]
+    start = min(stamps)
+    arrivals = [((t - start).total_seconds() / 60, c) for t, c in zip(stamps, cases)]
+    arrivals.sort(key=lambda a: a[0])
+    return arrivals
+
+def synthetic_arrivals(cases, arrivals_per_hour: float, hours: float, rng, hourly_profile=None):
+    """
+    Poisson arrivals, optionally shaped by a 24-entry hourly multiplier (thinning).
+    """
+    peak = max(hourly_profile) if hourly_profile else 1.0
+    rate = arrivals_per_hour * peak / 60  # per minute, at peak
+    t = 0.0
+    end = hours * 60
+    while True:
+        t += rng.expovariate(rate)
+        if t >= end:
+            return
+        if hourly_profile:
+            hour = int(t // 60) % 24
+            if rng.random() > hourly_profile[hour] / peak:
+                continue
+        yield t, rng.choice(cases)
+
+def _doctors_on_shift(entry, hour: int) -> int:
+    if isinstance(entry, int):
+        return entry
+    for start, end, count in entry:
+        if start <= end and start <= hour < end:
+            return count
+        if start > end and (hour >= start or hour < end):  # overnight shift
+            return count
+    return 0
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[idx]
+
+def _summarize(values):
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p90": None, "p99": None, "max": None}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": _percentile(values, 50),
+        "p90": _percentile(values, 90),
+        "p99": _percentile(values, 99),
+        "max": max(values)
+    }
+
+def run_simulation(arrivals_per_hour: float = 12, hours: float = 24 * 30, roster: dict = None,
+                   arrivals=None, hourly_profile=None, seed: int = 42, sample_every: float = 15):
+    """
+    1. Fresh in-memory DB with the roster's doctors
+    2. Event loop: arrival -> admit_patient, service start -> discharge_patient,
+       service end after ~Exp(avg_service_time), shift changes -> toggle_doctor_activation
+    3. Report queue lengths and waits per risk level (all in minutes)
+
+    Each department serves its queue by priority_weight DESC, arrival ASC (same as /patients).
+    """
+    rng = random.Random(seed)
+    roster = roster or DEFAULT_ROSTER
+
+    previous_db = database.DB_PATH
+    use_database(SIM_DB_URI)
+    with contextlib.redirect_stdout(io.StringIO()):
+        keeper = get_db_connection()  # keeps the shared in-memory DB alive
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            init_db()
+        reset_routing_state()
+
+        depts = {row['name']: dict(row) for row in keeper.execute("SELECT id, name, avg_service_time FROM departments")}
+        if arrivals is None:
+            arrivals = synthetic_arrivals(load_cases(), arrivals_per_hour, hours, rng, hourly_profile)
+
+        # Doctors: create the max needed per dept, shifts toggle them on/off
+        doctors = {}
+        for name, entry in roster.items():
+            if name not in depts:
+                continue
+            most = max(_doctors_on_shift(entry, h) for h in range(24))
+            doctors[name] = [add_doctor(f"Sim {name} {i + 1}", depts[name]['id'])["id"] for i in range(most)]
+        on_shift = {name: len(ids) for name, ids in doctors.items()}
+
+        queues = {name: [] for name in depts}  # heap of (-priority, arrival, seq, patient_id, risk)
+        busy = {name: 0 for name in depts}
+        waits = {}
+        queue_samples = []
+        seq = 0
+
+        events = []  # heap of (time, seq, kind, payload)
+        arrivals = iter(arrivals)
+
+        def push(time, kind, payload=None):
+            nonlocal seq
+            seq += 1
+            heapq.heappush(events, (time, seq, kind, payload))
+
+        def next_arrival():
+            nxt = next(arrivals, None)
+            if nxt is not None:
+                push(nxt[0], "arrival", nxt[1])
+
+        def set_shift(hour):
+            for name, ids in doctors.items():
+                wanted = _doctors_on_shift(roster[name], hour)
+                if wanted == on_shift[name]:
+                    continue
+                for i, doctor_id in enumerate(ids):
+                    if (i < wanted) != (i < on_shift[name]):
+                        toggle_doctor_activation(doctor_id, i < wanted)
+                on_shift[name] = wanted
+
+        def start_service(name, now):
+            queue = queues[name]
+            while queue and busy[name] < on_shift.get(name, 0):
+                _, arrived, _, patient_id, risk = heapq.heappop(queue)
+                discharge_patient(patient_id)  # leaves the waiting queue
+                waits.setdefault(risk, []).append(now - arrived)
+                busy[name] += 1
+                push(now + rng.expovariate(1 / depts[name]['avg_service_time']), "service_end", name)
+
+        set_shift(0)
+        next_arrival()
+        push(0, "sample")
+        if any(not isinstance(e, int) for e in roster.values()):
+            push(60, "shift")
+
+        end = hours * 60
+        while events:
+            now, _, kind, payload = heapq.heappop(events)
+            if now > end:
+                break
+
+            if kind == "arrival":
+                case = payload
+                admission = admit_patient(case, case["Risk_Level"], case["Recommended_Dept"])
+                name = admission["assigned_dept"]
+                heapq.heappush(queues.setdefault(name, []),
+                               (-admission["priority"], now, seq, admission["id"], case["Risk_Level"]))
+                busy.setdefault(name, 0)
+                start_service(name, now)
+                next_arrival()
+
+            elif kind == "service_end":
+                busy[payload] -= 1
+                start_service(payload, now)
+
+            elif kind == "shift":
+                set_shift(int(now // 60) % 24)
+                for name in queues:
+                    start_service(name, now)
+                push(now + 60, "shift")
+
+            elif kind == "sample":
+                lengths = {name: len(q) for name, q in queues.items()}
+                queue_samples.append((now, sum(lengths.values()), lengths))
+                push(now + sample_every, "sample")
+
+        # Patients still waiting at the end: count their wait so far
+        unserved = {}
+        for name, queue in queues.items():
+            for _, arrived, _, _, risk in queue:
+                waits.setdefault(risk, []).append(end - arrived)
+                unserved[risk] = unserved.get(risk, 0) + 1
+
+        totals = [total for _, total, _ in queue_samples]
+        per_dept = {
+            name: {"mean": sum(s[2].get(name, 0) for s in queue_samples) / max(len(queue_samples), 1),
+                   "max": max((s[2].get(name, 0) for s in queue_samples), default=0)}
+            for name in queues
+        }
+        all_waits = [w for values in waits.values() for w in values]
+
+        return {
+            "arrivals_per_hour": arrivals_per_hour,
+            "hours": hours,
+            "patients": len(all_waits),
+            "unserved": unserved,
+            "queue_length": {
+                "mean": sum(totals) / max(len(totals), 1),
+                "p95": _percentile(totals, 95),
+                "max": max(totals, default=0),
+                "final": totals[-1] if totals else 0,
+                "departments": per_dept
+            },
+            "wait_minutes": {
+                "overall": _summarize(all_waits),
+                **{risk: _summarize(values) for risk, values in waits.items()}
+            }
+        }
+    finally:
+        keeper.close()
+        use_database(previous_db)
+        reset_routing_state()
+
+def is_stable(report: dict, max_p90_wait: float) -> bool:
+    """
+    Stable = the queue doesn't grow without bound and waits stay under the target.
+    """
+    overall = report["wait_minutes"]["overall"]
+    backlog_ok = report["queue_length"]["final"] <= max(report["arrivals_per_hour"], 10)
+    wait_ok = overall["p90"] is None or overall["p90"] <= max_p90_wait
+    return backlog_ok and wait_ok
+
+def find_breaking_point(roster: dict = None, hours: float = 24 * 7, low: float = 1, high: float = 200,
+                        max_p90_wait: float = 120, tolerance: float = 0.5, seed: int = 42):
+    """
+    Binary search for the highest arrivals/hour the roster handles (see is_stable).
+    """
+    if not is_stable(run_simulation(low, hours, roster, seed=seed), max_p90_wait):
+        return low
+    while high - low > tolerance:
+        mid = (low + high) / 2
+        if is_stable(run_simulation(mid, hours, roster, seed=seed), max_p90_wait):
+            low = mid
+        else:
+            high = mid
+    return low
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate ER traffic through TriageX routing")
+    parser.add_argument("--rate", type=float, default=12, help="Arrivals per hour (synthetic)")
+    parser.add_argument("--days", type=float, default=30, help="Simulated days")
+    parser.add_argument("--roster", type=str, default=None,
+                        help='JSON, e.g. {"Cardiology": 3, "General": [[8, 20, 3], [20, 8, 1]]}')
+    parser.add_argument("--arrivals", type=str, default=None,
+                        help="Historical CSV (patient_data.csv columns + Arrival_Time)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--breaking-point", action="store_true",
+                        help="Search for the max sustainable arrivals/hour")
+    parser.add_argument("--max-p90-wait", type=float, default=120,
+                        help="Wait target (minutes) for --breaking-point")
+    args = parser.parse_args()
+
+    roster = json.loads(args.roster) if args.roster else None
+
+    if args.breaking_point:
+        rate = find_breaking_point(roster, hours=args.days * 24, max_p90_wait=args.max_p90_wait, seed=args.seed)
+        print(json.dumps({"breaking_point_arrivals_per_hour": rate}, indent=2))
+    else:
+        arrivals = load_arrivals(args.arrivals) if args.arrivals else None
+        rate, hours = args.rate, args.days * 24
+        if arrivals:
+            span = max(arrivals[-1][0] / 60, 1)
+            rate, hours = len(arrivals) / span, span + 24  # let the tail drain
+        report = run_simulation(rate, hours, roster, arrivals=arrivals, seed=args.seed)
+        print(json.dumps(report, indent=2))
@@ -3,9 +3,13 @@ import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 from xgboost import XGBClassifier
-from sklearn.metrics import classification_report
+from sklearn.metrics import classification_report, accuracy_score, recall_score
 import joblib
+import argparse
+import json
 import os
+import sys
+import time
 
 # Define paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -132,9 +136,200 @@ def train_and_save(target_col, model_name, encoder_name):
     joblib.dump(model, os.path.join(MODELS_DIR, model_name))
     print(f"Saved {model_name}")
 
-# Train all three models
-train_and_save("Risk_Level", "risk_model.pkl", "label_encoder.pkl")
-train_and_save("Recommended_Dept", "dept_model.pkl", "dept_encoder.pkl")
-train_and_save("Safety_Advice", "advice_model.pkl", "advice_encoder.pkl")
+# --- Serving Model Sweep ---
+# Latency-vs-accuracy sweep over tree count, depth and feature subsets.
+# Every candidate is scored on the same held-out split as train_and_save.
 
-print("\nAll models trained and saved!")
+SWEEP_N_ESTIMATORS = [25, 50, 100, 200]
+SWEEP_MAX_DEPTHS = [2, 3, 4, 6]
+SWEEP_FEATURE_SETS = {
+    "all": None,
+    # Drop raw age/gender, keep raw vitals + flags
+    "vitals_and_flags": ["Heart Rate", "Temperature", "Systolic_BP", "Diastolic_BP",
+                         "Is_Hypertensive", "Is_Tachycardic", "Has_Fever", "Age_Group",
+                         "Chest_Pain", "Breathlessness", "Confusion", "Fever_Symptom"],
+    # Binary/ordinal features only
+    "flags_only": ["Gender", "Age_Group", "Is_Hypertensive", "Is_Tachycardic", "Has_Fever",
+                   "Chest_Pain", "Breathlessness", "Confusion", "Fever_Symptom"],
+}
+
+def measure_latency(model, X_eval, n_rows=200, batch_size=256, repeats=5):
+    """
+    Measures inference latency on this machine:
+    - Per-row: one-row DataFrames, the shape /predict scores
+    - Per-batch: `batch_size` rows scored in one call
+    """
+    rows = [X_eval.iloc[[i % len(X_eval)]] for i in range(n_rows)]
+    batch = X_eval.iloc[np.arange(batch_size) % len(X_eval)]
+
+    # Warm-up so the first call doesn't skew the numbers
+    model.predict_proba(rows[0])
+    model.predict_proba(batch)
+
+    row_times = []
+    for row in rows:
+        start = time.perf_counter()
+        model.predict_proba(row)
+        row_times.append(time.perf_counter() - start)
+
+    batch_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.predict_proba(batch)
+        batch_times.append(time.perf_counter() - start)
+
+    batch_ms = float(np.median(batch_times)) * 1000
+    return {
+        "row_p50_ms": float(np.percentile(row_times, 50)) * 1000,
+        "row_p95_ms": float(np.percentile(row_times, 95)) * 1000,
+        "batch_ms": batch_ms,
+        "batch_per_row_us": batch_ms * 1000 / batch_size,
+    }
+
+# Per-row latencies are dominated by fixed call overhead and differ by fractions of a
+# millisecond: within this relative tolerance two candidates count as equally fast.
+LATENCY_TOLERANCE = 0.15
+
+def pareto_frontier(results):
+    """
+    Keeps candidates not dominated on (row latency, High recall, accuracy).
+    Lower latency is better, higher recall/accuracy are better.
+    Latency is compared with LATENCY_TOLERANCE so measurement noise can't make
+    a faster-but-worse model dominate.
+    """
+    def dominates(a, b):
+        no_worse = (a["row_p50_ms"] <= b["row_p50_ms"] * (1 + LATENCY_TOLERANCE)
+                    and a["high_recall"] >= b["high_recall"]
+                    and a["accuracy"] >= b["accuracy"])
+        better = (a["row_p50_ms"] < b["row_p50_ms"] * (1 - LATENCY_TOLERANCE)
+                  or a["high_recall"] > b["high_recall"]
+                  or a["accuracy"] > b["accuracy"])
+        return no_worse and better
+
+    frontier = [r for r in results if not any(dominates(o, r) for o in results)]
+    return sorted(frontier, key=lambda r: r["row_p50_ms"])
+
+def pick_serving_model(frontier, latency_budget_ms=None):
+    """
+    Best High recall (then accuracy) on the frontier within the latency budget.
+    Returns None if nothing fits the budget.
+    """
+    eligible = [r for r in frontier
+                if latency_budget_ms is None or r["row_p50_ms"] <= latency_budget_ms]
+    if not eligible:
+        return None
+    return max(eligible, key=lambda r: (r["high_recall"], r["accuracy"], -r["row_p50_ms"]))
+
+def sweep_serving_models(target_col="Risk_Level", latency_budget_ms=None):
+    """
+    1. Train every (n_estimators, max_depth, feature set) candidate
+    2. Score held-out accuracy + recall on "High" (macro recall if no "High" class)
+    3. Measure per-row and per-batch latency
+    4. Return all results, the Pareto frontier and the pick under the budget
+    """
+    le = LabelEncoder()
+    y = le.fit_transform(df[target_col])
+    drop_cols = ["Risk_Level", "Recommended_Dept", "Safety_Advice", "Patient_ID"]
+    X = df.drop(columns=[c for c in drop_cols if c in df.columns])
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    high_label = list(le.classes_).index("High") if "High" in le.classes_ else None
+
+    results = []
+    for set_name, cols in SWEEP_FEATURE_SETS.items():
+        cols = cols or list(X.columns)
+        for n_estimators in SWEEP_N_ESTIMATORS:
+            for max_depth in SWEEP_MAX_DEPTHS:
+                model = XGBClassifier(n_estimators=n_estimators, max_depth=max_depth, learning_rate=0.1)
+                model.fit(X_train[cols], y_train)
+                preds = model.predict(X_test[cols])
+
+                if high_label is not None:
+                    high_recall = recall_score(y_test, preds, labels=[high_label], average="macro", zero_division=0)
+                else:
+                    high_recall = recall_score(y_test, preds, average="macro", zero_division=0)
+
+                result = {
+                    "n_estimators": n_estimators,
+                    "max_depth": max_depth,
+                    "feature_set": set_name,
+                    "features": cols,
+                    "accuracy": float(accuracy_score(y_test, preds)),
+                    "high_recall": float(high_recall),
+                    **measure_latency(model, X_test[cols]),
+                }
+                results.append((result, model))
+                print(f"  {set_name:<17} n={n_estimators:<4} depth={max_depth}  "
+                      f"acc={result['accuracy']:.3f}  high_recall={result['high_recall']:.3f}  "
+                      f"row={result['row_p50_ms']:.3f}ms  batch={result['batch_per_row_us']:.1f}us/row")
+
+    frontier = pareto_frontier([r for r, _ in results])
+    chosen = pick_serving_model(frontier, latency_budget_ms)
+    chosen_model = next((m for r, m in results if r is chosen), None)
+    return [r for r, _ in results], frontier, chosen, chosen_model, le
+
+def run_sweep(target_col, model_name, encoder_name, latency_budget_ms=None, save=False):
+    print(f"\nSweeping serving candidates for {target_col}...")
+    results, frontier, chosen, chosen_model, le = sweep_serving_models(target_col, latency_budget_ms)
+
+    print("\nPareto frontier (row latency vs High recall vs accuracy):")
+    for r in frontier:
+        marker = "*" if r is chosen else " "
+        print(f" {marker} {r['feature_set']:<17} n={r['n_estimators']:<4} depth={r['max_depth']}  "
+              f"acc={r['accuracy']:.3f}  high_recall={r['high_recall']:.3f}  "
+              f"row={r['row_p50_ms']:.3f}ms (p95 {r['row_p95_ms']:.3f})  "
+              f"batch={r['batch_per_row_us']:.1f}us/row")
+
+    report_path = os.path.join(MODELS_DIR, f"sweep_{target_col.lower()}.json")
+    with open(report_path, "w") as f:
+        json.dump({
+            "target": target_col,
+            "latency_budget_ms": latency_budget_ms,
+            "results": results,
+            "frontier": frontier,
+            "chosen": chosen,
+        }, f, indent=2)
+    print(f"\nSaved sweep report to {report_path}")
+
+    if chosen is None:
+        fastest = frontier[0]["row_p50_ms"]
+        print(f"\nWARNING: no candidate meets the {latency_budget_ms}ms budget "
+              f"(fastest p50 is {fastest:.3f}ms). Nothing saved.")
+        return False
+
+    if save:
+        # Feature subset travels with the model (feature_names_in_), see model_service
+        joblib.dump(le, os.path.join(MODELS_DIR, encoder_name))
+        joblib.dump(chosen_model, os.path.join(MODELS_DIR, model_name))
+        print(f"Saved {model_name} ({chosen['feature_set']}, n={chosen['n_estimators']}, depth={chosen['max_depth']})")
+    return True
+
+SWEEP_TARGETS = {
+    "Risk_Level": ("risk_model.pkl", "label_encoder.pkl"),
+    "Recommended_Dept": ("dept_model.pkl", "dept_encoder.pkl"),
+    "Safety_Advice": ("advice_model.pkl", "advice_encoder.pkl"),
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train TriageX models")
+    parser.add_argument("--sweep", action="store_true",
+                        help="Run the latency-vs-accuracy sweep instead of the default training")
+    parser.add_argument("--target", default="Risk_Level", choices=list(SWEEP_TARGETS),
+                        help="Model head to sweep")
+    parser.add_argument("--latency-budget-ms", type=float, default=None,
+                        help="Max per-row p50 latency for the serving pick")
+    parser.add_argument("--save", action="store_true",
+                        help="Overwrite the serving model with the sweep pick")
+    args = parser.parse_args()
+
+    if args.sweep:
+        model_name, encoder_name = SWEEP_TARGETS[args.target]
+        if not run_sweep(args.target, model_name, encoder_name, args.latency_budget_ms, args.save):
+            sys.exit(1)
+    else:
+        # Train all three models
+        train_and_save("Risk_Level", "risk_model.pkl", "label_encoder.pkl")
+        train_and_save("Recommended_Dept", "dept_model.pkl", "dept_encoder.pkl")
+        train_and_save("Safety_Advice", "advice_model.pkl", "advice_encoder.pkl")
+
+        print("\nAll models trained and saved!")